@@ -314,28 +314,28 @@ class AceResolver(object):
         aces_out = []
         for ace in aces:
             out = {
-                'RightName': ace['rightname'],
-                'AceType': ace['acetype']
+                'RightName': ace.rightname,
+                'AceType': ace.acetype
             }
             # Is it a well-known sid?
-            if ace['sid'] in ADUtils.WELLKNOWN_SIDS:
-                out['PrincipalName'] = u'%s@%s' % (ADUtils.WELLKNOWN_SIDS[ace['sid']][0].upper(), self.addomain.domain.upper())
-                out['PrincipalType'] = ADUtils.WELLKNOWN_SIDS[ace['sid']][1].lower()
+            if ace.sid in ADUtils.WELLKNOWN_SIDS:
+                out['PrincipalName'] = u'%s@%s' % (ADUtils.WELLKNOWN_SIDS[ace.sid][0].upper(), self.addomain.domain.upper())
+                out['PrincipalType'] = ADUtils.WELLKNOWN_SIDS[ace.sid][1].lower()
             else:
                 try:
-                    entry = self.addomain.sidcache.get(ace['sid'])
+                    entry = self.addomain.sidcache.get(ace.sid)
                 except KeyError:
                     # Look it up instead
                     # Is this SID part of the current domain? If not, use GC
-                    use_gc = not ace['sid'].startswith(self.addomain.domain_object.sid)
-                    ldapentry = self.resolver.resolve_sid(ace['sid'], use_gc)
+                    use_gc = not ace.sid.startswith(self.addomain.domain_object.sid)
+                    ldapentry = self.resolver.resolve_sid(ace.sid, use_gc)
                     # Couldn't resolve...
                     if not ldapentry:
-                        logging.warning('Could not resolve SID: %s', ace['sid'])
+                        logging.warning('Could not resolve SID: %s', ace.sid)
                         continue
                     entry = ADUtils.resolve_ad_entry(ldapentry)
                     # Cache it
-                    self.addomain.sidcache.put(ace['sid'], entry)
+                    self.addomain.sidcache.put(ace.sid, entry)
                 out['PrincipalName'] = entry['principal'].upper()
                 out['PrincipalType'] = entry['type']
             aces_out.append(out)
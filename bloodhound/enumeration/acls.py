@@ -22,17 +22,23 @@
 #
 ####################
 from __future__ import unicode_literals
-import logging
-import threading
-from multiprocessing import Pool
-from ldap3.utils.conv import escape_filter_chars
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from impacket.uuid import string_to_bin, bin_to_string
-from bloodhound.ad.utils import ADUtils
-from bloodhound.lib import cstruct
-from io import BytesIO
-import binascii
-import pprint
-from future.utils import iteritems, native_str
+from future.utils import native_str
+
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional - without it classify_mask runs as plain Python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        if args and callable(args[0]):
+            return args[0]
+        return decorator
 
 # Extended rights and property GUID mapping, converted to binary so we don't have to do this
 # for every comparison.
@@ -59,124 +65,342 @@ OBJECTTYPE_GUID_MAP = {
     'groupPolicyContainer': 'f30e3bc2-9ff0-11d1-b603-0000f80367c1'
 }
 
+# Binary version of the map above, so ACE ObjectType GUIDs can be compared
+# raw without formatting and lowercasing a UUID string for every ACE
+OBJECTTYPE_GUID_BIN = {k: string_to_bin(v) for k, v in OBJECTTYPE_GUID_MAP.items()}
+
+# The same GUIDs as 128-bit ints. Comparing two ints is a single CPU compare,
+# where comparing 16-byte strings goes through length/type checks and memcmp;
+# one int.from_bytes per ACE replaces up to five of those
+EXTRIGHTS_GUID_INT = {k: int.from_bytes(v, 'little') for k, v in EXTRIGHTS_GUID_MAPPING.items()}
+OBJECTTYPE_GUID_INT = {k: int.from_bytes(v, 'little') for k, v in OBJECTTYPE_GUID_BIN.items()}
+
+# Binary forms of the SIDs whose ACEs are ignored: S-1-3-0 (Creator Owner)
+# and S-1-5-18 (Local System). Both have a single subauthority, so they are
+# exactly 12 bytes long
+_IGNORE_SID_BIN = frozenset([
+    struct.pack('<BB6sI', 1, 1, b'\x00\x00\x00\x00\x00\x03', 0),
+    struct.pack('<BB6sI', 1, 1, b'\x00\x00\x00\x00\x00\x05', 18),
+])
+
+# Entry types are encoded as small ints so classify_mask only deals with
+# integers (required for JIT compilation). Types without ACE logic of their
+# own (computer etc.) map to _ET_OTHER.
+_ET_USER    = 0
+_ET_GROUP   = 1
+_ET_DOMAIN  = 2
+_ET_OTHER   = 255
+_ENTRYTYPE_IDS = {
+    'user': _ET_USER,
+    'group': _ET_GROUP,
+    'domain': _ET_DOMAIN,
+}
+
+# Maps each bit returned by classify_mask to the relation it represents.
+# Bit numbers are chosen so that iterating from the lowest set bit upwards
+# yields relations in the same order the old if-cascade appended them
+# (plain ACEs check WriteDacl last, hence the separate 0x400 entry).
+RELATION_TABLE = {
+    0x001: ('GenericAll', ''),
+    0x002: ('GenericWrite', ''),
+    0x004: ('WriteDacl', ''),
+    0x008: ('WriteOwner', ''),
+    0x010: ('GenericWrite', ''),
+    0x020: ('WriteProperty', 'AddMember'),
+    0x040: ('ExtendedRight', 'All'),
+    0x080: ('ExtendedRight', 'GetChanges'),
+    0x100: ('ExtendedRight', 'GetChangesAll'),
+    0x200: ('ExtendedRight', 'User-Force-Change-Password'),
+    0x400: ('WriteDacl', ''),
+}
+
+# Branchless ACE dispatch: one action code per (AceType, inherit flag bits)
+# combination, indexed by (AceType << 2) | ((AceFlags & 0x18) >> 3).
+# 0 = skip, 1 = plain allowed ACE, 2 = object ACE, 3 = inherited object ACE
+# (which needs the InheritedObjectType restriction check).
+_ACE_ACTION = bytearray(1024)
+for _flagbits in range(4):
+    _ACE_ACTION[(0x00 << 2) | _flagbits] = 1
+_ACE_ACTION[(0x05 << 2) | 0b00] = 2
+# 0b01 (inherit-only, not inherited) stays 0: not applicable to this object
+_ACE_ACTION[(0x05 << 2) | 0b10] = 3
+_ACE_ACTION[(0x05 << 2) | 0b11] = 3
+del _flagbits
+
+# Mask constants duplicated from ACCESS_MASK as module-level ints, since
+# Numba can only freeze simple global constants into the compiled function
+_GENERIC_ALL    = 0x000F01FF
+_GENERIC_WRITE  = 0x00020028
+_WRITE_DACL     = 0x00040000
+_WRITE_OWNER    = 0x00080000
+_DS_WRITE_PROP      = 0x00000020
+_DS_CONTROL_ACCESS  = 0x00000100
+
+@njit(cache=True)
+def classify_mask(mask, et, is_object_ace, ot_present, ot_match, wm_match, gc_match, gca_match, ufcp_match):
+    """
+    Decide which relations an ACE fires based on its access mask, the entry
+    type and the precomputed ObjectType GUID matches. Returns a bitfield
+    indexing into RELATION_TABLE, or 0 if the ACE yields nothing.
+    Pure integer/boolean logic so Numba can compile it to a branch tree of
+    native compares when available.
+    """
+    bits = 0
+    if is_object_ace:
+        # Check generic access masks first
+        if (mask & _GENERIC_ALL == _GENERIC_ALL or mask & _WRITE_DACL == _WRITE_DACL
+                or mask & _WRITE_OWNER == _WRITE_OWNER or mask & _GENERIC_WRITE == _GENERIC_WRITE):
+            # For all generic rights we should check if it applies to our object type
+            if ot_present and not ot_match:
+                return 0
+            if mask & _GENERIC_ALL == _GENERIC_ALL:
+                # Generic all includes all other rights, so stop here
+                return 0x001
+            if mask & _GENERIC_WRITE == _GENERIC_WRITE:
+                bits |= 0x002
+                # Don't stop for the domain object, since BloodHound reports
+                # duplicate rights as well
+                if et != _ET_DOMAIN:
+                    return bits
+            if mask & _WRITE_DACL == _WRITE_DACL:
+                bits |= 0x004
+            if mask & _WRITE_OWNER == _WRITE_OWNER:
+                bits |= 0x008
+        # Property write privileges
+        if mask & _DS_WRITE_PROP == _DS_WRITE_PROP:
+            if (et == _ET_USER or et == _ET_GROUP) and not ot_present:
+                bits |= 0x010
+            if et == _ET_GROUP and (not ot_present or wm_match):
+                bits |= 0x020
+        # Extended rights
+        if mask & _DS_CONTROL_ACCESS == _DS_CONTROL_ACCESS:
+            if (et == _ET_USER or et == _ET_DOMAIN) and not ot_present:
+                bits |= 0x040
+            if et == _ET_DOMAIN and (not ot_present or gc_match):
+                bits |= 0x080
+            if et == _ET_DOMAIN and (not ot_present or gca_match):
+                bits |= 0x100
+            if et == _ET_USER and (not ot_present or ufcp_match):
+                bits |= 0x200
+    else:
+        if mask & _GENERIC_ALL == _GENERIC_ALL:
+            return 0x001
+        if mask & _GENERIC_WRITE == _GENERIC_WRITE:
+            bits |= 0x002
+        if mask & _WRITE_OWNER == _WRITE_OWNER:
+            bits |= 0x008
+        if (et == _ET_USER or et == _ET_DOMAIN) and mask & _DS_CONTROL_ACCESS == _DS_CONTROL_ACCESS:
+            bits |= 0x040
+        if mask & _WRITE_DACL == _WRITE_DACL:
+            bits |= 0x400
+    return bits
+
+def _bits_to_rights(bits):
+    """
+    Expand a classify_mask bitfield into its (rightname, acetype) tuples,
+    lowest bit first so relation order matches the old if-cascade.
+    """
+    out = []
+    while bits:
+        bit = bits & -bits
+        out.append(RELATION_TABLE[bit])
+        bits ^= bit
+    return out
+
+def _classify_object_ace(mask, et, ot_int, target_guid_int,
+                         _writemember=EXTRIGHTS_GUID_INT['WriteMember'],
+                         _getchanges=EXTRIGHTS_GUID_INT['GetChanges'],
+                         _getchangesall=EXTRIGHTS_GUID_INT['GetChangesAll'],
+                         _forcechangepw=EXTRIGHTS_GUID_INT['UserForceChangePassword']):
+    """
+    Classify an ACCESS_ALLOWED_OBJECT_ACE in one call: fuses the ObjectType
+    GUID comparisons with the mask decision tree and returns the list of
+    (rightname, acetype) tuples the ACE fires. ot_int is the ObjectType GUID
+    as a 128-bit int, or None when the ACE has no ObjectType and thus applies
+    to all properties and rights. target_guid_int is the GUID of the entry's
+    object class as an int (-1 when unknown).
+    """
+    if ot_int is None:
+        bits = classify_mask(mask, et, True, False, False,
+                             False, False, False, False)
+    else:
+        bits = classify_mask(mask, et, True, True, ot_int == target_guid_int,
+                             ot_int == _writemember, ot_int == _getchanges,
+                             ot_int == _getchangesall, ot_int == _forcechangepw)
+    return _bits_to_rights(bits)
+
+def _init_worker(extrights, objecttype_bin):
+    """
+    Pool worker initializer. Installs the GUID tables shipped from the parent
+    process into this module's globals, so they are set up once per worker at
+    startup instead of lazily during the first task. On platforms where workers
+    are spawned instead of forked (macOS/Windows) this replaces per-worker
+    rebuilding with a single pickle round-trip.
+    """
+    global EXTRIGHTS_GUID_MAPPING, OBJECTTYPE_GUID_BIN
+    EXTRIGHTS_GUID_MAPPING = extrights
+    OBJECTTYPE_GUID_BIN = objecttype_bin
+
+def _parse_one(job):
+    """
+    Unpack a single (entry, entrytype, acl) job. Module-level so it can be
+    pickled to pool workers.
+    """
+    entry, entrytype, acl = job
+    return parse_binary_acl(entry, entrytype, acl)
+
+def parse_binary_acls_batch(batch):
+    """
+    Parse a list of (entry, entrytype, acl) tuples in one worker task.
+    Submitting one ACL per task means one pickle/unpickle round-trip each;
+    for a large domain that IPC overhead dwarfs the parsing itself, so a
+    single round-trip should serve a whole batch.
+    """
+    return [parse_binary_acl(entry, entrytype, acl) for entry, entrytype, acl in batch]
+
 def parse_binary_acl(entry, entrytype, acl):
     """
     Main ACL structure parse function.
     This is offloaded to subprocesses and takes the current entry and the
-    acl data as argument. This is then returned and processed back in the main process
+    acl data as argument. This is then returned and processed back in the main
+    process. Dispatches to a parser specialized for the entry type.
     """
     if not acl:
         return entry, []
-    sd = SecurityDescriptor(BytesIO(acl))
-    relations = []
-    # Parse owner
-    osid = str(sd.owner_sid)
-    ignoresids = ["S-1-3-0", "S-1-5-18"]
-    # Ignore Creator Owner or Local System
-    if osid not in ignoresids:
-        relations.append(build_relation(osid, 'Owner'))
-    for ace_object in sd.dacl.aces:
-        if ace_object.ace.AceType != 0x05 and ace_object.ace.AceType != 0x00:
-            # These are the only two aces we care about currently
-            logging.debug('Don\'t care about acetype %d', ace_object.ace.AceType)
-            continue
-        # Check if sid is ignored
-        sid = str(ace_object.acedata.sid)
-        # Ignore Creator Owner or Local System
-        if sid in ignoresids:
-            continue
-        if ace_object.ace.AceType == 0x05:
-            # ACCESS_ALLOWED_OBJECT_ACE
-            if not ace_object.has_flag(ACE.INHERITED_ACE) and ace_object.has_flag(ACE.INHERIT_ONLY_ACE):
-                # ACE is set on this object, but only inherited, so not applicable to us
-                continue
-
-            # Check if the ACE has restrictions on object type (inherited case)
-            if ace_object.has_flag(ACE.INHERITED_ACE) \
-                and ace_object.acedata.has_flag(ACCESS_ALLOWED_OBJECT_ACE.ACE_INHERITED_OBJECT_TYPE_PRESENT):
-                # Verify if the ACE applies to this object type
-                if not ace_applies(ace_object.acedata.get_inherited_object_type().lower(), entrytype):
-                    continue
+    try:
+        parser = _PARSERS[entrytype]
+    except KeyError:
+        parser = _PARSERS.setdefault(entrytype, _make_parser(entrytype))
+    return parser(entry, acl)
 
-            mask = ace_object.acedata.mask
-            # Now the magic, we have to check all the rights BloodHound cares about
-
-            # Check generic access masks first
-            if mask.has_priv(ACCESS_MASK.GENERIC_ALL) or mask.has_priv(ACCESS_MASK.WRITE_DACL) \
-                or mask.has_priv(ACCESS_MASK.WRITE_OWNER) or mask.has_priv(ACCESS_MASK.GENERIC_WRITE):
-                # For all generic rights we should check if it applies to our object type
-                if ace_object.acedata.has_flag(ACCESS_ALLOWED_OBJECT_ACE.ACE_OBJECT_TYPE_PRESENT) \
-                    and not ace_applies(ace_object.acedata.get_object_type().lower(), entrytype):
-                    # If it does not apply, break out of the loop here in order to
-                    # avoid individual rights firing later on
+def _make_parser(entrytype):
+    """
+    Build a parse function specialized for a single entry type. Everything
+    that depends on the entry type - its id, its class GUID and whether the
+    class has a GUID mapping at all - is evaluated here once and bound into
+    the closure, instead of being re-derived per call and re-tested per ACE.
+    Classes without a mapping (computer etc.) get a variant that drops every
+    object-type-restricted ACE on the flags word alone.
+    """
+    et = _ENTRYTYPE_IDS.get(entrytype, _ET_OTHER)
+    target_guid_int = OBJECTTYPE_GUID_INT.get(entrytype, -1)
+
+    if target_guid_int != -1:
+        def parse(entry, acl):
+            relations = []
+            revision, sbz1, control, offset_owner, offset_group, \
+                offset_sacl, offset_dacl = _SD_HDR.unpack_from(acl, 0)
+            # Parse owner; ignore Creator Owner or Local System
+            if offset_owner != 0 and acl[offset_owner:offset_owner + 12] not in _IGNORE_SID_BIN:
+                relations.append(build_relation(str(LdapSid(acl, offset_owner)), 'Owner'))
+            if offset_dacl == 0:
+                return entry, relations
+            acl_revision, sbz1, acl_size, ace_count, sbz2 = _ACL_HDR.unpack_from(acl, offset_dacl)
+            offset = offset_dacl + 8
+            for _i in range(ace_count):
+                ace_type, ace_flags, ace_size = _ACE_HDR.unpack_from(acl, offset)
+                ace_offset = offset + 4
+                offset += ace_size
+                # Single-table dispatch on ace type and inherit flags.
+                # Allowed and allowed-object aces are the only two we care
+                # about currently
+                code = _ACE_ACTION[(ace_type << 2) | ((ace_flags >> 3) & 3)]
+                if not code:
                     continue
-                # Check from high to low, ignore lower privs which may also match the bitmask,
-                # even though this shouldn't happen since we check for exact matches currently
-                if mask.has_priv(ACCESS_MASK.GENERIC_ALL):
-                    relations.append(build_relation(sid, 'GenericAll'))
+                is_object_ace = code >= 2
+                if is_object_ace:
+                    # ACCESS_ALLOWED_OBJECT_ACE: the optional ObjectType and
+                    # InheritedObjectType GUIDs (flag bits 1 and 2) sit
+                    # between the flags and the SID
+                    mask, objectflags = _ACE_OBJECT_HDR.unpack_from(acl, ace_offset)
+                    ot_present = objectflags & 1
+                    guid_offset = ace_offset + 8
+                    sid_offset = guid_offset + 16 * ((objectflags & 1) + ((objectflags >> 1) & 1))
+                else:
+                    # ACCESS_ALLOWED_ACE
+                    mask, = _ACE_MASK.unpack_from(acl, ace_offset)
+                    sid_offset = ace_offset + 4
+                # Check if sid is ignored before doing any further parsing
+                # work. Both ignored SIDs have one subauthority, so they are
+                # exactly 12 bytes; the fixed-size slice cannot match a
+                # longer SID since byte 1 is the subauthority count
+                if acl[sid_offset:sid_offset + 12] in _IGNORE_SID_BIN:
                     continue
-                if mask.has_priv(ACCESS_MASK.GENERIC_WRITE):
-                    relations.append(build_relation(sid, 'GenericWrite'))
-                    # Don't skip this if it's the domain object, since BloodHound reports duplicate
-                    # rights as well, and this might influence some queries
-                    if entrytype != 'domain':
-                        continue
-
-                # These are specific bitmasks so don't break the loop from here
-                if mask.has_priv(ACCESS_MASK.WRITE_DACL):
-                    relations.append(build_relation(sid, 'WriteDacl'))
-
-                if mask.has_priv(ACCESS_MASK.WRITE_OWNER):
-                    relations.append(build_relation(sid, 'WriteOwner'))
-
-            # Property write privileges
-            writeprivs = ace_object.acedata.mask.has_priv(ACCESS_MASK.ADS_RIGHT_DS_WRITE_PROP)
-            if writeprivs:
-                # GenericWrite
-                if entrytype in ['user', 'group'] and not ace_object.acedata.has_flag(ACCESS_ALLOWED_OBJECT_ACE.ACE_OBJECT_TYPE_PRESENT):
-                    relations.append(build_relation(sid, 'GenericWrite'))
-                if entrytype == 'group' and can_write_property(ace_object, EXTRIGHTS_GUID_MAPPING['WriteMember']):
-                    relations.append(build_relation(sid, 'WriteProperty', 'AddMember'))
-
-            # Extended rights
-            control_access = ace_object.acedata.mask.has_priv(ACCESS_MASK.ADS_RIGHT_DS_CONTROL_ACCESS)
-            if control_access:
-                # All Extended
-                if entrytype in ['user', 'domain'] and not ace_object.acedata.has_flag(ACCESS_ALLOWED_OBJECT_ACE.ACE_OBJECT_TYPE_PRESENT):
-                    relations.append(build_relation(sid, 'ExtendedRight', 'All'))
-                if entrytype == 'domain' and has_extended_right(ace_object, EXTRIGHTS_GUID_MAPPING['GetChanges']):
-                    relations.append(build_relation(sid, 'ExtendedRight', 'GetChanges'))
-                if entrytype == 'domain' and has_extended_right(ace_object, EXTRIGHTS_GUID_MAPPING['GetChangesAll']):
-                    relations.append(build_relation(sid, 'ExtendedRight', 'GetChangesAll'))
-                if entrytype == 'user' and has_extended_right(ace_object, EXTRIGHTS_GUID_MAPPING['UserForceChangePassword']):
-                    relations.append(build_relation(sid, 'ExtendedRight', 'User-Force-Change-Password'))
-
-            # print(ace_object.acedata.sid)
-        if ace_object.ace.AceType == 0x00:
-            mask = ace_object.acedata.mask
-            # ACCESS_ALLOWED_ACE
-            if mask.has_priv(ACCESS_MASK.GENERIC_ALL):
-                # Generic all includes all other rights, so skip from here
-                relations.append(build_relation(sid, 'GenericAll'))
-                continue
-
-            if mask.has_priv(ACCESS_MASK.GENERIC_WRITE):
-                # Genericwrite is only for properties, don't skip after
-                relations.append(build_relation(sid, 'GenericWrite'))
-
-            if mask.has_priv(ACCESS_MASK.WRITE_OWNER):
-                relations.append(build_relation(sid, 'WriteOwner'))
+                # Now the magic, we have to check all the rights BloodHound
+                # cares about
+                if is_object_ace:
+                    # Check if the ACE has restrictions on object type
+                    # (inherited case)
+                    if code == 3 and objectflags & 2:
+                        ioi_offset = guid_offset + 16 * (objectflags & 1)
+                        # Verify if the ACE applies to this object type
+                        if int.from_bytes(acl[ioi_offset:ioi_offset + 16], 'little') != target_guid_int:
+                            continue
+                    ot_int = int.from_bytes(acl[guid_offset:guid_offset + 16], 'little') if ot_present else None
+                    rights = _classify_object_ace(mask, et, ot_int, target_guid_int)
+                else:
+                    rights = _bits_to_rights(classify_mask(mask, et, False, False, False,
+                                                           False, False, False, False))
+                if not rights:
+                    continue
+                # Only build the SID string for ACEs that actually yield
+                # relations
+                sid = str(LdapSid(acl, sid_offset))
+                for rightname, acetype in rights:
+                    relations.append(build_relation(sid, rightname, acetype))
 
-            # For users and domain, check extended rights
-            if entrytype in ['user', 'domain'] and mask.has_priv(ACCESS_MASK.ADS_RIGHT_DS_CONTROL_ACCESS):
-                relations.append(build_relation(sid, 'ExtendedRight', 'All'))
+            return entry, relations
+    else:
+        def parse(entry, acl):
+            relations = []
+            revision, sbz1, control, offset_owner, offset_group, \
+                offset_sacl, offset_dacl = _SD_HDR.unpack_from(acl, 0)
+            # Parse owner; ignore Creator Owner or Local System
+            if offset_owner != 0 and acl[offset_owner:offset_owner + 12] not in _IGNORE_SID_BIN:
+                relations.append(build_relation(str(LdapSid(acl, offset_owner)), 'Owner'))
+            if offset_dacl == 0:
+                return entry, relations
+            acl_revision, sbz1, acl_size, ace_count, sbz2 = _ACL_HDR.unpack_from(acl, offset_dacl)
+            offset = offset_dacl + 8
+            for _i in range(ace_count):
+                ace_type, ace_flags, ace_size = _ACE_HDR.unpack_from(acl, offset)
+                ace_offset = offset + 4
+                offset += ace_size
+                code = _ACE_ACTION[(ace_type << 2) | ((ace_flags >> 3) & 3)]
+                if not code:
+                    continue
+                is_object_ace = code >= 2
+                if is_object_ace:
+                    mask, objectflags = _ACE_OBJECT_HDR.unpack_from(acl, ace_offset)
+                    # No ACE restricted to an object type can apply to an
+                    # entry class without a GUID mapping
+                    if objectflags & 1 or (code == 3 and objectflags & 2):
+                        continue
+                    # A not-yet-inherited ACE can still carry an
+                    # InheritedObjectType GUID ahead of the SID
+                    sid_offset = ace_offset + 8 + (16 if objectflags & 2 else 0)
+                else:
+                    mask, = _ACE_MASK.unpack_from(acl, ace_offset)
+                    sid_offset = ace_offset + 4
+                if acl[sid_offset:sid_offset + 12] in _IGNORE_SID_BIN:
+                    continue
+                # Without an ObjectType only the generic rights can fire
+                rights = _bits_to_rights(classify_mask(mask, et, is_object_ace, False, False,
+                                                       False, False, False, False))
+                if not rights:
+                    continue
+                sid = str(LdapSid(acl, sid_offset))
+                for rightname, acetype in rights:
+                    relations.append(build_relation(sid, rightname, acetype))
 
-            if mask.has_priv(ACCESS_MASK.WRITE_DACL):
-                relations.append(build_relation(sid, 'WriteDacl'))
+            return entry, relations
+    return parse
 
-    # pprint.pprint(entry)
-        # pprint.pprint(relations)
-    return entry, relations
+# Specialized parsers for the entry types the enumerators pass in; any other
+# type gets one built and cached on first use
+_PARSERS = {_et_name: _make_parser(_et_name) for _et_name in
+            ('user', 'group', 'domain', 'organizationalUnit',
+             'groupPolicyContainer', 'computer')}
 
 def can_write_property(ace_object, binproperty):
     '''
@@ -193,7 +417,7 @@ def can_write_property(ace_object, binproperty):
         return True
     else:
         # Both are binary here
-        if ace_object.acedata.data.ObjectType == binproperty:
+        if ace_object.acedata.ObjectType == binproperty:
             return True
         else:
             return False
@@ -213,28 +437,33 @@ def has_extended_right(ace_object, binrightguid):
         return True
     else:
         # Both are binary here
-        if ace_object.acedata.data.ObjectType == binrightguid:
+        if ace_object.acedata.ObjectType == binrightguid:
             return True
         else:
             return False
 
-def ace_applies(ace_guid, object_class):
+def ace_applies(ace_guid, object_class, _guid_map=OBJECTTYPE_GUID_BIN):
     '''
     Checks if an ACE applies to this object (based on object classes).
+    The ace_guid is the raw 16-byte GUID from the ACE, compared against the
+    binary GUID map so no UUID string formatting is needed per ACE. A miss
+    via dict.get is much cheaper than raising KeyError for object classes
+    that are not in the map, and the default-argument binding saves the
+    global lookup per call.
     Note that this function assumes you already verified that InheritedObjectType is set (via the flag).
     If this is not set, the ACE applies to all object types.
     '''
-    try:
-        our_ace_guid = OBJECTTYPE_GUID_MAP[object_class]
-    except KeyError:
-        return False
-    if ace_guid == our_ace_guid:
-        return True
-    # If none of these match, the ACE does not apply to this object
-    return False
+    our_ace_guid = _guid_map.get(object_class)
+    return our_ace_guid is not None and ace_guid == our_ace_guid
+
+# A relation was previously a fresh 3-key dict per ACE match; a namedtuple
+# is a third of the size, allocates faster and the right names themselves
+# all come from the interned constants in RELATION_TABLE. Use _asdict() if
+# a consumer really needs a dict
+Relation = namedtuple('Relation', ('rightname', 'sid', 'acetype'))
 
 def build_relation(sid, relation, acetype=''):
-    return {'rightname': relation, 'sid': sid, 'acetype': acetype}
+    return Relation(relation, sid, acetype)
 
 class AclEnumerator(object):
     """
@@ -248,160 +477,171 @@ class AclEnumerator(object):
         self.pool = None
 
     def init_pool(self):
-        self.pool = Pool()
+        self.pool = ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                        initializer=_init_worker,
+                                        initargs=(EXTRIGHTS_GUID_MAPPING, OBJECTTYPE_GUID_BIN))
+
+    def submit_many(self, jobs):
+        """
+        Submit (entry, entrytype, acl) jobs to the pool and return an iterator
+        over their futures in completion order, so the producer can keep
+        pipelining LDAP results without waiting for pool shutdown.
+        """
+        futures = [self.pool.submit(parse_binary_acl, entry, entrytype, acl)
+                   for entry, entrytype, acl in jobs]
+        return as_completed(futures)
+
+    def parse_many(self, entries):
+        """
+        Parse a list of (entry, entrytype, acl) tuples on the pool.
+        Returns an iterator over (entry, relations) results. Using map with
+        a chunksize batches many small ACL blobs into one IPC round-trip
+        instead of pickling them one by one.
+        """
+        chunksize = max(32, len(entries) // (4 * (os.cpu_count() or 1)))
+        return self.pool.map(_parse_one, entries, chunksize=chunksize)
+
+    def map_batched(self, jobs, batch_size=256):
+        """
+        Parse a list of (entry, entrytype, acl) jobs on the pool, batch_size
+        jobs per worker task. Yields (entry, relations) results unordered as
+        batches complete.
+        """
+        batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+        futures = [self.pool.submit(parse_binary_acls_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for result in future.result():
+                yield result
 
 """
-The following is Security Descriptor parsing using cstruct
-Thanks to Erik Schamper for helping me implement this!
+The following is Security Descriptor parsing using struct.unpack_from
+over the raw descriptor buffer with explicit offsets. The previous
+implementation (thanks to Erik Schamper!) parsed the same structures via
+cstruct over nested BytesIO objects, which allocated a buffer copy per
+ACE; a single pass with precompiled Structs avoids that entirely.
+Structure reference: https://msdn.microsoft.com/en-us/library/cc230273.aspx
 """
-cdef = native_str("""
-struct SECURITY_DESCRIPTOR {
-    uint8   Revision;
-    uint8   Sbz1;
-    uint16  Control;
-    uint32  OffsetOwner;
-    uint32  OffsetGroup;
-    uint32  OffsetSacl;
-    uint32  OffsetDacl;
-};
-
-struct LDAP_SID_IDENTIFIER_AUTHORITY {
-    char    Value[6];
-};
-
-struct LDAP_SID {
-    uint8   Revision;
-    uint8   SubAuthorityCount;
-    LDAP_SID_IDENTIFIER_AUTHORITY   IdentifierAuthority;
-    uint32  SubAuthority[SubAuthorityCount];
-};
-
-struct ACL {
-    uint8   AclRevision;
-    uint8   Sbz1;
-    uint16  AclSize;
-    uint16  AceCount;
-    uint16  Sbz2;
-    char    Data[AclSize - 8];
-};
-
-struct ACE {
-    uint8   AceType;
-    uint8   AceFlags;
-    uint16  AceSize;
-    char    Data[AceSize - 4];
-};
-
-struct ACCESS_ALLOWED_ACE {
-    uint32  Mask;
-    LDAP_SID Sid;
-};
-
-struct ACCESS_ALLOWED_OBJECT_ACE {
-    uint32  Mask;
-    uint32  Flags;
-    char    ObjectType[Flags & 1 * 16];
-    char    InheritedObjectType[Flags & 2 * 8];
-    LDAP_SID Sid;
-};
-""")
-c_secd = cstruct()
-c_secd.load(cdef, compiled=True)
+_SD_HDR = struct.Struct(native_str('<BBHIIII'))
+_ACL_HDR = struct.Struct(native_str('<BBHHH'))
+_ACE_HDR = struct.Struct(native_str('<BBH'))
+_ACE_OBJECT_HDR = struct.Struct(native_str('<II'))
+_ACE_MASK = struct.Struct(native_str('<I'))
+_SID_HDR = struct.Struct(native_str('<BB6s'))
 
 
 class SecurityDescriptor(object):
-    def __init__(self, fh):
-        self.fh = fh
-        self.descriptor = c_secd.SECURITY_DESCRIPTOR(fh)
+    # No per-instance __dict__ - these objects are allocated per descriptor
+    # or per ACE, so the fixed slot layout keeps them small and makes
+    # attribute access a direct offset read
+    __slots__ = ('owner_sid', 'group_sid', 'sacl', 'dacl')
+
+    def __init__(self, buf):
+        revision, sbz1, control, offset_owner, offset_group, \
+            offset_sacl, offset_dacl = _SD_HDR.unpack_from(buf, 0)
 
         self.owner_sid = b''
         self.group_sid = b''
         self.sacl = b''
         self.dacl = b''
 
-        if self.descriptor.OffsetOwner != 0:
-            fh.seek(self.descriptor.OffsetOwner)
-            self.owner_sid = LdapSid(fh=fh)
+        if offset_owner != 0:
+            self.owner_sid = LdapSid(buf, offset_owner)
 
-        if self.descriptor.OffsetGroup != 0:
-            fh.seek(self.descriptor.OffsetGroup)
-            self.group_sid = LdapSid(fh=fh)
+        if offset_group != 0:
+            self.group_sid = LdapSid(buf, offset_group)
 
-        if self.descriptor.OffsetSacl != 0:
-            fh.seek(self.descriptor.OffsetSacl)
-            self.sacl = ACL(fh)
+        if offset_sacl != 0:
+            self.sacl = ACL(buf, offset_sacl)
 
-        if self.descriptor.OffsetDacl != 0:
-            fh.seek(self.descriptor.OffsetDacl)
-            self.dacl = ACL(fh)
+        if offset_dacl != 0:
+            self.dacl = ACL(buf, offset_dacl)
 
 
 class LdapSid(object):
-    def __init__(self, fh=None, in_obj=None):
-        if fh:
-            self.fh = fh
-            self.ldap_sid = c_secd.LDAP_SID(fh)
-        else:
-            self.ldap_sid = in_obj
+    __slots__ = ('Revision', 'IdentifierAuthority', 'SubAuthority', 'size', '_str')
+
+    def __init__(self, buf, offset):
+        self.Revision, subauthority_count, self.IdentifierAuthority = _SID_HDR.unpack_from(buf, offset)
+        self.SubAuthority = struct.unpack_from(native_str('<%dI' % subauthority_count), buf, offset + 8)
+        # Total size in bytes, so the ACE parser can locate the next field
+        self.size = 8 + 4 * subauthority_count
+        # Lazily built string form - repeated str() calls are free
+        self._str = None
 
     def __repr__(self):
-        return "S-{}-{}-{}".format(self.ldap_sid.Revision, bytearray(self.ldap_sid.IdentifierAuthority.Value)[5], "-".join(['{:d}'.format(v) for v in self.ldap_sid.SubAuthority]))
+        if self._str is None:
+            # The identifier authority is 6 bytes big-endian, but byte 5
+            # carries the whole value for every authority seen in practice
+            self._str = "S-{}-{}-{}".format(self.Revision, self.IdentifierAuthority[5],
+                                            "-".join(map(str, self.SubAuthority)))
+        return self._str
 
 
 class ACL(object):
-    def __init__(self, fh):
-        self.fh = fh
-        self.acl = c_secd.ACL(fh)
+    __slots__ = ('AclRevision', 'AclSize', 'aces')
+
+    def __init__(self, buf, offset):
+        self.AclRevision, sbz1, self.AclSize, ace_count, sbz2 = _ACL_HDR.unpack_from(buf, offset)
         self.aces = []
 
-        buf = BytesIO(self.acl.Data)
-        for i in range(self.acl.AceCount):
-            self.aces.append(ACE(buf))
+        offset += 8
+        for i in range(ace_count):
+            ace = ACE(buf, offset)
+            self.aces.append(ace)
+            offset += ace.AceSize
 
 
 class ACCESS_ALLOWED_ACE(object):
-    def __init__(self, fh):
-        self.fh = fh
-        self.data = c_secd.ACCESS_ALLOWED_ACE(fh)
-        self.sid = LdapSid(in_obj=self.data.Sid)
-        self.mask = ACCESS_MASK(self.data.Mask)
+    __slots__ = ('Mask', 'sid', 'mask')
+
+    def __init__(self, buf, offset):
+        self.Mask, = _ACE_MASK.unpack_from(buf, offset)
+        self.sid = LdapSid(buf, offset + 4)
+        self.mask = ACCESS_MASK(self.Mask)
 
     def __repr__(self):
         return "<ACCESS_ALLOWED_OBJECT_ACE Sid=%s Mask=%s>" % (str(self.sid), str(self.mask))
 
 class ACCESS_DENIED_ACE(ACCESS_ALLOWED_ACE):
-    pass
+    __slots__ = ()
 
 
 class ACCESS_ALLOWED_OBJECT_ACE(object):
+    __slots__ = ('Mask', 'Flags', 'ObjectType', 'InheritedObjectType', 'sid', 'mask')
+
     # Flag constants
     ACE_OBJECT_TYPE_PRESENT             = 0x01
     ACE_INHERITED_OBJECT_TYPE_PRESENT   = 0x02
 
-    def __init__(self, fh):
-        self.fh = fh
-        self.data = c_secd.ACCESS_ALLOWED_OBJECT_ACE(fh)
-        self.sid = LdapSid(in_obj=self.data.Sid)
-        self.mask = ACCESS_MASK(self.data.Mask)
+    def __init__(self, buf, offset):
+        self.Mask, self.Flags = _ACE_OBJECT_HDR.unpack_from(buf, offset)
+        offset += 8
+        self.ObjectType = b''
+        self.InheritedObjectType = b''
+        if self.Flags & self.ACE_OBJECT_TYPE_PRESENT:
+            self.ObjectType = bytes(buf[offset:offset + 16])
+            offset += 16
+        if self.Flags & self.ACE_INHERITED_OBJECT_TYPE_PRESENT:
+            self.InheritedObjectType = bytes(buf[offset:offset + 16])
+            offset += 16
+        self.sid = LdapSid(buf, offset)
+        self.mask = ACCESS_MASK(self.Mask)
 
     def has_flag(self, flag):
-        return self.data.Flags & flag == flag
+        return self.Flags & flag == flag
 
     def get_object_type(self):
         if self.has_flag(self.ACE_OBJECT_TYPE_PRESENT):
-            return bin_to_string(self.data.ObjectType)
+            return bin_to_string(self.ObjectType)
         return None
 
     def get_inherited_object_type(self):
         if self.has_flag(self.ACE_INHERITED_OBJECT_TYPE_PRESENT):
-            return bin_to_string(self.data.InheritedObjectType)
+            return bin_to_string(self.InheritedObjectType)
         return None
 
     def __repr__(self):
-        out = []
-        for name, value in iteritems(vars(ACCESS_ALLOWED_OBJECT_ACE)):
-            if not name.startswith('_') and type(value) is int and self.has_flag(value):
-                out.append(name)
+        out = [name for name, value in self._FLAG_NAMES if self.Flags & value == value]
         data = (' | '.join(out),
                 str(self.sid),
                 str(self.mask),
@@ -410,7 +650,7 @@ class ACCESS_ALLOWED_OBJECT_ACE(object):
         return "<ACCESS_ALLOWED_OBJECT_ACE Flags=%s Sid=%s \n\t\tMask=%s \n\t\tObjectType=%s InheritedObjectType=%s>" % data
 
 class ACCESS_DENIED_OBJECT_ACE(ACCESS_ALLOWED_OBJECT_ACE):
-    pass
+    __slots__ = ()
 
 
 """
@@ -418,6 +658,8 @@ ACCESS_MASK as described in 2.4.3
 https://msdn.microsoft.com/en-us/library/cc230294.aspx
 """
 class ACCESS_MASK(object):
+    __slots__ = ('mask',)
+
     # Flag constants
 
     # These constants are only used when WRITING
@@ -466,15 +708,14 @@ class ACCESS_MASK(object):
         self.mask ^= priv
 
     def __repr__(self):
-        out = []
-        for name, value in iteritems(vars(ACCESS_MASK)):
-            if not name.startswith('_') and type(value) is int and self.has_priv(value):
-                out.append(name)
+        out = [name for name, value in self._FLAG_NAMES if self.mask & value == value]
         return "<ACCESS_MASK RawMask=%d Flags=%s>" % (self.mask, ' | '.join(out))
 
 
 
 class ACE(object):
+    __slots__ = ('AceType', 'AceFlags', 'AceSize', 'acedata', 'mask')
+
     CONTAINER_INHERIT_ACE       = 0x02
     FAILED_ACCESS_ACE_FLAG      = 0x80
     INHERIT_ONLY_ACE            = 0x08
@@ -483,35 +724,54 @@ class ACE(object):
     OBJECT_INHERIT_ACE          = 0x01
     SUCCESSFUL_ACCESS_ACE_FLAG  = 0x04
 
-    def __init__(self, fh):
-        self.fh = fh
-        self.ace = c_secd.ACE(fh)
+    def __init__(self, buf, offset):
+        self.AceType, self.AceFlags, self.AceSize = _ACE_HDR.unpack_from(buf, offset)
         self.acedata = None
-        buf = BytesIO(self.ace.Data)
-        if self.ace.AceType == 0x00:
+        offset += 4
+        if self.AceType == 0x00:
             # ACCESS_ALLOWED_ACE
-            self.acedata = ACCESS_ALLOWED_ACE(buf)
-        elif self.ace.AceType == 0x05:
+            self.acedata = ACCESS_ALLOWED_ACE(buf, offset)
+        elif self.AceType == 0x05:
             # ACCESS_ALLOWED_OBJECT_ACE
-            self.acedata = ACCESS_ALLOWED_OBJECT_ACE(buf)
-        elif self.ace.AceType == 0x01:
+            self.acedata = ACCESS_ALLOWED_OBJECT_ACE(buf, offset)
+        elif self.AceType == 0x01:
             # ACCESS_DENIED_ACE
-            self.acedata = ACCESS_DENIED_ACE(buf)
-        elif self.ace.AceType == 0x06:
+            self.acedata = ACCESS_DENIED_ACE(buf, offset)
+        elif self.AceType == 0x06:
             # ACCESS_DENIED_OBJECT_ACE
-            self.acedata = ACCESS_DENIED_OBJECT_ACE(buf)
+            self.acedata = ACCESS_DENIED_OBJECT_ACE(buf, offset)
         # else:
-        #     print 'Unsupported type %d' % self.ace.AceType
+        #     print 'Unsupported type %d' % self.AceType
 
         if self.acedata:
-            self.mask = ACCESS_MASK(self.acedata.data.Mask)
+            # The ace data classes already wrap their mask; alias it instead
+            # of building a second ACCESS_MASK per ACE
+            self.mask = self.acedata.mask
 
     def __repr__(self):
-        out = []
-        for name, value in iteritems(vars(ACE)):
-            if not name.startswith('_') and type(value) is int and self.has_flag(value):
-                out.append(name)
-        return "<ACE Type=%s Flags=%s RawFlags=%d \n\tAce=%s>" % (self.ace.AceType, ' | '.join(out), self.ace.AceFlags, str(self.acedata))
+        out = [name for name, value in self._FLAG_NAMES if self.AceFlags & value == value]
+        return "<ACE Type=%s Flags=%s RawFlags=%d \n\tAce=%s>" % (self.AceType, ' | '.join(out), self.AceFlags, str(self.acedata))
 
     def has_flag(self, flag):
-        return self.ace.AceFlags & flag == flag
+        return self.AceFlags & flag == flag
+
+
+def _flag_names(cls):
+    """
+    Static (name, value) pairs of a class's int flag constants, captured once
+    at import so __repr__ does not reflect over vars() on every call.
+    """
+    return tuple((name, value) for name, value in vars(cls).items()
+                 if not name.startswith('_') and type(value) is int)
+
+ACCESS_ALLOWED_OBJECT_ACE._FLAG_NAMES = _flag_names(ACCESS_ALLOWED_OBJECT_ACE)
+ACCESS_MASK._FLAG_NAMES = _flag_names(ACCESS_MASK)
+ACE._FLAG_NAMES = _flag_names(ACE)
+
+# Use the Cython build of the parse loop when the extension was compiled
+# (see setup.py); it is signature- and output-compatible. This sits at the
+# bottom of the module since acls_fast imports its tables from here.
+try:
+    from bloodhound.enumeration.acls_fast import parse_binary_acl
+except ImportError:
+    pass
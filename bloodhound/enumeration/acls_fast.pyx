@@ -0,0 +1,196 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+####################
+#
+# Copyright (c) 2018 Fox-IT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+####################
+"""
+Cython build of the hot ACL parsing path. This is an optional extension;
+bloodhound.enumeration.acls transparently falls back to its pure-Python
+parse_binary_acl when it is not compiled. The logic here must stay in
+lockstep with that implementation.
+"""
+from cpython.bytes cimport PyBytes_AS_STRING
+
+from bloodhound.enumeration.acls import (
+    EXTRIGHTS_GUID_MAPPING, OBJECTTYPE_GUID_BIN, RELATION_TABLE,
+    _ENTRYTYPE_IDS, _ET_OTHER, _ACE_ACTION, _IGNORE_SID_BIN,
+    LdapSid, build_relation,
+)
+
+cdef unsigned int _ET_DOMAIN_ID = _ENTRYTYPE_IDS['domain']
+cdef unsigned int _ET_USER_ID = _ENTRYTYPE_IDS['user']
+cdef unsigned int _ET_GROUP_ID = _ENTRYTYPE_IDS['group']
+
+cdef bytes _WRITEMEMBER = EXTRIGHTS_GUID_MAPPING['WriteMember']
+cdef bytes _GETCHANGES = EXTRIGHTS_GUID_MAPPING['GetChanges']
+cdef bytes _GETCHANGESALL = EXTRIGHTS_GUID_MAPPING['GetChangesAll']
+cdef bytes _FORCECHANGEPW = EXTRIGHTS_GUID_MAPPING['UserForceChangePassword']
+
+DEF GENERIC_ALL         = 0x000F01FF
+DEF GENERIC_WRITE       = 0x00020028
+DEF WRITE_DACL          = 0x00040000
+DEF WRITE_OWNER         = 0x00080000
+DEF DS_WRITE_PROP       = 0x00000020
+DEF DS_CONTROL_ACCESS   = 0x00000100
+
+
+cdef inline unsigned int _u16(const unsigned char *p):
+    return p[0] | (p[1] << 8)
+
+
+cdef inline unsigned int _u32(const unsigned char *p):
+    return p[0] | (p[1] << 8) | (p[2] << 16) | (p[3] << 24)
+
+
+cdef inline unsigned int _classify_mask(unsigned int mask, unsigned int et,
+                                        bint is_object_ace, bint ot_present,
+                                        bint ot_match, bint wm_match, bint gc_match,
+                                        bint gca_match, bint ufcp_match):
+    """
+    C version of acls.classify_mask: same inputs, same bitfield out.
+    """
+    cdef unsigned int bits = 0
+    if is_object_ace:
+        if (mask & GENERIC_ALL == GENERIC_ALL or mask & WRITE_DACL == WRITE_DACL
+                or mask & WRITE_OWNER == WRITE_OWNER or mask & GENERIC_WRITE == GENERIC_WRITE):
+            if ot_present and not ot_match:
+                return 0
+            if mask & GENERIC_ALL == GENERIC_ALL:
+                return 0x001
+            if mask & GENERIC_WRITE == GENERIC_WRITE:
+                bits |= 0x002
+                if et != _ET_DOMAIN_ID:
+                    return bits
+            if mask & WRITE_DACL == WRITE_DACL:
+                bits |= 0x004
+            if mask & WRITE_OWNER == WRITE_OWNER:
+                bits |= 0x008
+        if mask & DS_WRITE_PROP == DS_WRITE_PROP:
+            if (et == _ET_USER_ID or et == _ET_GROUP_ID) and not ot_present:
+                bits |= 0x010
+            if et == _ET_GROUP_ID and (not ot_present or wm_match):
+                bits |= 0x020
+        if mask & DS_CONTROL_ACCESS == DS_CONTROL_ACCESS:
+            if (et == _ET_USER_ID or et == _ET_DOMAIN_ID) and not ot_present:
+                bits |= 0x040
+            if et == _ET_DOMAIN_ID and (not ot_present or gc_match):
+                bits |= 0x080
+            if et == _ET_DOMAIN_ID and (not ot_present or gca_match):
+                bits |= 0x100
+            if et == _ET_USER_ID and (not ot_present or ufcp_match):
+                bits |= 0x200
+    else:
+        if mask & GENERIC_ALL == GENERIC_ALL:
+            return 0x001
+        if mask & GENERIC_WRITE == GENERIC_WRITE:
+            bits |= 0x002
+        if mask & WRITE_OWNER == WRITE_OWNER:
+            bits |= 0x008
+        if (et == _ET_USER_ID or et == _ET_DOMAIN_ID) and mask & DS_CONTROL_ACCESS == DS_CONTROL_ACCESS:
+            bits |= 0x040
+        if mask & WRITE_DACL == WRITE_DACL:
+            bits |= 0x400
+    return bits
+
+
+def parse_binary_acl(entry, entrytype, acl):
+    """
+    Main ACL structure parse function, compiled. Signature and output are
+    identical to the pure-Python bloodhound.enumeration.acls.parse_binary_acl.
+    """
+    if not acl:
+        return entry, []
+    cdef bytes buf = acl
+    cdef const unsigned char *data = <const unsigned char *>PyBytes_AS_STRING(buf)
+    cdef unsigned int offset_owner = _u32(data + 4)
+    cdef unsigned int offset_dacl = _u32(data + 16)
+    cdef unsigned int et, ace_count, offset, ace_offset, guid_offset
+    cdef unsigned int sid_offset, ioi_offset, mask, objectflags, bits, bit
+    cdef unsigned int i, ace_type, ace_flags, ace_size, code
+    cdef bint is_object_ace, ot_present, ioi_present, et_known
+
+    relations = []
+    # Parse owner; ignore Creator Owner or Local System
+    if offset_owner != 0 and buf[offset_owner:offset_owner + 12] not in _IGNORE_SID_BIN:
+        relations.append(build_relation(str(LdapSid(buf, offset_owner)), 'Owner'))
+    if offset_dacl == 0:
+        return entry, relations
+
+    et = _ENTRYTYPE_IDS.get(entrytype, _ET_OTHER)
+    target_guid = OBJECTTYPE_GUID_BIN.get(entrytype)
+    et_known = target_guid is not None
+
+    ace_count = _u16(data + offset_dacl + 4)
+    offset = offset_dacl + 8
+    for i in range(ace_count):
+        ace_type = data[offset]
+        ace_flags = data[offset + 1]
+        ace_size = _u16(data + offset + 2)
+        ace_offset = offset + 4
+        offset += ace_size
+        code = _ACE_ACTION[(ace_type << 2) | ((ace_flags >> 3) & 3)]
+        if not code:
+            continue
+        is_object_ace = code >= 2
+        if is_object_ace:
+            mask = _u32(data + ace_offset)
+            objectflags = _u32(data + ace_offset + 4)
+            ot_present = objectflags & 1
+            ioi_present = objectflags & 2
+            if not et_known and (ot_present or (code == 3 and ioi_present)):
+                continue
+            guid_offset = ace_offset + 8
+            sid_offset = guid_offset + 16 * ((objectflags & 1) + ((objectflags >> 1) & 1))
+        else:
+            mask = _u32(data + ace_offset)
+            sid_offset = ace_offset + 4
+        # Check if sid is ignored before any further parsing work
+        if buf[sid_offset:sid_offset + 12] in _IGNORE_SID_BIN:
+            continue
+        if is_object_ace:
+            if code == 3 and ioi_present:
+                ioi_offset = guid_offset + 16 * (objectflags & 1)
+                # Verify if the ACE applies to this object type
+                if buf[ioi_offset:ioi_offset + 16] != target_guid:
+                    continue
+            if ot_present:
+                ot_bytes = buf[guid_offset:guid_offset + 16]
+                bits = _classify_mask(mask, et, True, True, ot_bytes == target_guid,
+                                      ot_bytes == _WRITEMEMBER, ot_bytes == _GETCHANGES,
+                                      ot_bytes == _GETCHANGESALL, ot_bytes == _FORCECHANGEPW)
+            else:
+                bits = _classify_mask(mask, et, True, False, False,
+                                      False, False, False, False)
+        else:
+            bits = _classify_mask(mask, et, False, False, False,
+                                  False, False, False, False)
+        if not bits:
+            continue
+        # Only build the SID string for ACEs that actually yield relations
+        sid = str(LdapSid(buf, sid_offset))
+        while bits:
+            bit = bits & (~bits + 1)
+            rightname, acetype = RELATION_TABLE[bit]
+            relations.append(build_relation(sid, rightname, acetype))
+            bits ^= bit
+
+    return entry, relations
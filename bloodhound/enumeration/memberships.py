@@ -181,17 +181,16 @@ class MembershipEnumerator(object):
                     self.process_stuff(parse_binary_acl(user, 'user', ADUtils.get_entry_property(entry, 'nTSecurityDescriptor', raw=True)))
                 else:
                     # Process ACLs in separate processes, then call the processing function to resolve entries and write them to file
-                    self.aclenumerator.pool.apply_async(parse_binary_acl, args=(user, 'user', ADUtils.get_entry_property(entry, 'nTSecurityDescriptor', raw=True)), callback=self.process_stuff)
+                    self.aclenumerator.pool.submit(parse_binary_acl, user, 'user', ADUtils.get_entry_property(entry, 'nTSecurityDescriptor', raw=True)).add_done_callback(self.process_future)
             else:
                 # Write it to the queue -> write to file in separate thread
                 # this is solely for consistency with acl parsing, the performance improvement is probably minimal
                 self.result_q.put(user)
 
-        # If we are parsing ACLs, close the parsing pool first
+        # If we are parsing ACLs, shut down the parsing pool first
         # then close the result queue and join it
         if acl and not self.disable_pooling:
-            self.aclenumerator.pool.close()
-            self.aclenumerator.pool.join()
+            self.aclenumerator.pool.shutdown(wait=True)
             self.result_q.put(None)
         else:
             self.result_q.put(None)
@@ -264,17 +263,16 @@ class MembershipEnumerator(object):
                     self.process_stuff(parse_binary_acl(group, 'group', ADUtils.get_entry_property(entry, 'nTSecurityDescriptor', raw=True)))
                 else:
                     # Process ACLs in separate processes, then call the processing function to resolve entries and write them to file
-                    self.aclenumerator.pool.apply_async(parse_binary_acl, args=(group, 'group', ADUtils.get_entry_property(entry, 'nTSecurityDescriptor', raw=True)), callback=self.process_stuff)
+                    self.aclenumerator.pool.submit(parse_binary_acl, group, 'group', ADUtils.get_entry_property(entry, 'nTSecurityDescriptor', raw=True)).add_done_callback(self.process_future)
             else:
                 # Write it to the queue -> write to file in separate thread
                 # this is solely for consistency with acl parsing, the performance improvement is probably minimal
                 self.result_q.put(group)
 
-        # If we are parsing ACLs, close the parsing pool first
+        # If we are parsing ACLs, shut down the parsing pool first
         # then close the result queue and join it
         if acl and not self.disable_pooling:
-            self.aclenumerator.pool.close()
-            self.aclenumerator.pool.join()
+            self.aclenumerator.pool.shutdown(wait=True)
             self.result_q.put(None)
         else:
             self.result_q.put(None)
@@ -289,6 +287,12 @@ class MembershipEnumerator(object):
         self.result_q.put(data)
         # logging.debug('returned stuff')
 
+    def process_future(self, future):
+        # Executor completion callbacks get the future itself; unwrap it.
+        # Calling result() here also surfaces worker exceptions that
+        # Pool.apply_async used to swallow silently.
+        self.process_stuff(future.result())
+
     def enumerate_memberships(self):
         self.enumerate_users()
         self.enumerate_groups()
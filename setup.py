@@ -1,5 +1,20 @@
+import os
 from setuptools import setup
 
+# The ACL parsing extension is optional - the pure-Python implementation
+# is used when Cython is not available at build time, or when the .pyx
+# source is missing from the distribution being built
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = None
+
+_acls_pyx = os.path.join('bloodhound', 'enumeration', 'acls_fast.pyx')
+if cythonize is not None and os.path.exists(_acls_pyx):
+    ext_modules = cythonize([_acls_pyx])
+else:
+    ext_modules = []
+
 setup(name='bloodhound',
       version='0.7.0',
       description='Python based ingestor for BloodHound',
@@ -13,12 +28,14 @@ setup(name='bloodhound',
                 'bloodhound.lib',
                 'bloodhound.enumeration'],
       license='MIT',
+      ext_modules=ext_modules,
       install_requires=['dnspython', 'impacket>=0.9.17', 'ldap3==2.5.1', 'pyasn1>=0.4', 'future'],
+      python_requires='>=3.7',
       classifiers=[
         'Intended Audience :: Information Technology',
         'License :: OSI Approved :: MIT License',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7'
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.7'
       ],
       entry_points= {
         'console_scripts': ['bloodhound-python=bloodhound:main']